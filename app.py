@@ -1,91 +1,315 @@
-import json
+import os
+import threading
 import numpy as np
 import faiss
 from PIL import Image
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import torch
+import torch.nn.functional as F
+import faiss.contrib.torch_utils
+from torchvision.transforms import v2
 from transformers import CLIPProcessor, CLIPModel
 import gradio as gr
+import pyarrow as pa
+from build_metadata_arrow import read_metadata_json
 
-model = CLIPModel.from_pretrained("patrickjohncyh/fashion-clip")
+device = "cuda" if torch.cuda.is_available() else "cpu"
+model = CLIPModel.from_pretrained("patrickjohncyh/fashion-clip").to(device)
+if device == "cuda":
+    model = model.to(torch.bfloat16)
+    # get_*_features bypass model.forward, so compile the towers they call.
+    # Batched requests vary the batch size, so keep that dimension dynamic.
+    model.vision_model.compile(mode="max-autotune", dynamic=True)
+    model.text_model.compile(mode="max-autotune", dynamic=True)
 processor = CLIPProcessor.from_pretrained("patrickjohncyh/fashion-clip", use_fast=True)
 
 print("Loading FAISS indexes and metadata...")
-index_male = faiss.read_index("male.faiss")
-index_female = faiss.read_index("female.faiss")
+EMBED_DIM = 512
+INDEX_KIND = os.environ.get("FAISS_INDEX_KIND", "hnsw")
 
-with open("male_metadata.json", "r", encoding="utf-8") as f:
-    metadata_male = json.load(f)
+# Files from one git checkout get near-identical mtimes in any order.
+MTIME_SLACK_SEC = 5
 
-with open("female_metadata.json", "r", encoding="utf-8") as f:
-    metadata_female = json.load(f)
+def is_fresh(derived_path, source_path):
+    if not os.path.exists(derived_path):
+        return False
+    if not os.path.exists(source_path):
+        return True
+    return os.path.getmtime(derived_path) + MTIME_SLACK_SEC >= os.path.getmtime(source_path)
+
+def load_indexes(name):
+    # Prebuilt ANN indexes come from build_ann_index.py; fall back to exact
+    # search over the flat index when they are missing or older than it.
+    ann_paths = {key: f"{name}_{key}_{INDEX_KIND}.faiss" for key in ("both", "image", "text")}
+    if all(is_fresh(path, f"{name}.faiss") for path in ann_paths.values()):
+        return {key: faiss.read_index(path) for key, path in ann_paths.items()}
+    print(f"{name}: {INDEX_KIND} indexes missing or older than {name}.faiss, "
+          f"using exact search (rerun build_ann_index.py {INDEX_KIND})")
+
+    # Index vectors are normalize_L2([image, text]). A single-modality query
+    # only touches one half, so searching that half on its own gives the same
+    # scores as the zero-padded 1024-d query at half the cost.
+    index = faiss.read_index(f"{name}.faiss")
+    vectors = index.reconstruct_n(0, index.ntotal)
+    image_index = faiss.IndexFlatIP(EMBED_DIM)
+    image_index.add(np.ascontiguousarray(vectors[:, :EMBED_DIM]))
+    text_index = faiss.IndexFlatIP(EMBED_DIM)
+    text_index.add(np.ascontiguousarray(vectors[:, EMBED_DIM:]))
+    return {"both": index, "image": image_index, "text": text_index}
+
+indexes_male = load_indexes("male")
+indexes_female = load_indexes("female")
+
+if device == "cuda" and hasattr(faiss, "StandardGpuResources"):
+    gpu_res = faiss.StandardGpuResources()
+    gpu_res.setTempMemory(64 * 1024 * 1024)
+    gpu_options = faiss.GpuClonerOptions()
+    # IVFPQ with 64 sub-quantizers needs half-precision lookup tables on GPU.
+    # Only for IVFPQ: on flat indexes useFloat16 would store the vectors in fp16.
+    ivfpq_gpu_options = faiss.GpuClonerOptions()
+    ivfpq_gpu_options.useFloat16 = True
+    for indexes in (indexes_male, indexes_female):
+        for key, index in indexes.items():
+            options = ivfpq_gpu_options if isinstance(index, faiss.IndexIVFPQ) else gpu_options
+            try:
+                indexes[key] = faiss.index_cpu_to_gpu(gpu_res, 0, index, options)
+            except RuntimeError:
+                # e.g. HNSW has no GPU implementation; keep searching it on CPU.
+                pass
+
+def load_metadata(name):
+    # Built by build_metadata_arrow.py; memory-mapped, so rows are only read
+    # when a search returns them. A missing or stale file falls back to the
+    # JSON the notebook writes, read into memory.
+    if is_fresh(f"{name}_metadata.arrow", f"{name}_metadata.json"):
+        return pa.ipc.open_file(pa.memory_map(f"{name}_metadata.arrow")).read_all()
+    print(f"{name}_metadata.arrow missing or older than {name}_metadata.json, "
+          f"reading the JSON (rerun build_metadata_arrow.py)")
+    return read_metadata_json(name)
+
+metadata_male = load_metadata("male")
+metadata_female = load_metadata("female")
+
+for name, indexes, metadata in (("male", indexes_male, metadata_male), ("female", indexes_female, metadata_female)):
+    for key, index in indexes.items():
+        if index.ntotal != metadata.num_rows:
+            raise RuntimeError(f"{name} {key} index has {index.ntotal} vectors but metadata has {metadata.num_rows} rows")
 
 print("FAISS indexes and metadata loaded successfully!")
 
-def truncate_text(text, max_tokens=75):
-    tokens = processor.tokenizer.encode(text)
-    if len(tokens) > max_tokens:
-        tokens = tokens[:max_tokens]
-        truncated_text = processor.tokenizer.decode(tokens, skip_special_tokens=True)
-        return truncated_text
-    return text
+EXAMPLES = [
+    ["Male", None, "white t-shirt"],
+    ["Female", None, "black evening dress"],
+    ["Female", None, "brown high heels"],
+    ["Male", None, "blue denim jacket"],
+]
+
+TEXT_EMB_CACHE = {}
+
+MAX_BATCH_SIZE = 16
+
+_QUERY_LOCK = threading.Lock()
+_QUERY_BUFS = {
+    "both": torch.zeros((1, 2 * EMBED_DIM), device=device),
+    "image": torch.zeros((1, EMBED_DIM), device=device),
+    "text": torch.zeros((1, EMBED_DIM), device=device),
+}
+
+HTTP_TIMEOUT = (3, 10)
+_SESSION = requests.Session()
+_http_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=Retry(total=2, backoff_factor=0.3))
+_SESSION.mount("https://", _http_adapter)
+_SESSION.mount("http://", _http_adapter)
 
-def get_image_embedding(image):
+def autocast():
+    return torch.autocast(device_type=device, dtype=torch.bfloat16, enabled=device == "cuda")
+
+CLIP_IMAGE_SIZE = 224
+
+def load_image(image):
+    if isinstance(image, str):
+        response = _SESSION.get(image, timeout=HTTP_TIMEOUT)
+        image = Image.open(BytesIO(response.content))
+        # JPEGs can decode straight at 1/2, 1/4 or 1/8 scale, never below the requested size.
+        image.draft("RGB", (CLIP_IMAGE_SIZE, CLIP_IMAGE_SIZE))
+    # Convert before resizing: Pillow resamples "P" and "1" images with NEAREST.
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    # Shrink the short side to the CLIP input size up front so only a small
+    # image is copied to the device and image_transform's resize is a no-op.
+    width, height = image.size
+    scale = CLIP_IMAGE_SIZE / min(width, height)
+    if scale < 1:
+        # reducing_gap box-downsamples large uploads by an integer factor first,
+        # so the bicubic pass only runs over a few times the target size.
+        image = image.resize((round(width * scale), round(height * scale)), Image.BICUBIC, reducing_gap=3.0)
+    return image
+
+image_transform = v2.Compose([
+    v2.ToDtype(model.dtype, scale=True),
+    v2.Resize(CLIP_IMAGE_SIZE, interpolation=v2.InterpolationMode.BICUBIC, antialias=True),
+    v2.CenterCrop(CLIP_IMAGE_SIZE),
+])
+_MEAN = torch.tensor(processor.image_processor.image_mean, dtype=model.dtype, device=device).view(1, 3, 1, 1)
+_STD = torch.tensor(processor.image_processor.image_std, dtype=model.dtype, device=device).view(1, 3, 1, 1)
+
+def preprocess_image(image):
+    # Only the uint8 conversion happens on CPU; resize/crop/normalize run on the model device.
+    pixels = v2.functional.pil_to_tensor(image).to(device, non_blocking=True)
+    return (image_transform(pixels).unsqueeze(0) - _MEAN) / _STD
+
+def get_image_embeddings(pixel_values, normalize=True):
+    with torch.inference_mode(), autocast():
+        image_features = model.get_image_features(pixel_values=pixel_values)
+    image_features = image_features.float()
+    return F.normalize(image_features, dim=-1) if normalize else image_features
+
+# Fixed-length text keeps the compiled text tower to one sequence shape.
+TEXT_PADDING = dict(padding="max_length", truncation=True, max_length=77)
+
+def get_text_embeddings(texts, normalize=True):
+    inputs = processor(text=texts, return_tensors="pt", **TEXT_PADDING).to(device)
+    with torch.inference_mode(), autocast():
+        text_features = model.get_text_features(**inputs)
+    text_features = text_features.float()
+    return F.normalize(text_features, dim=-1) if normalize else text_features
+
+def get_joint_embeddings(pixel_values, texts):
+    inputs = processor(text=texts, return_tensors="pt", **TEXT_PADDING).to(device)
+    with torch.inference_mode(), autocast():
+        outputs = model(**inputs, pixel_values=pixel_values)
+        # outputs.image_embeds/text_embeds are normalized per modality; the
+        # indexes were built from the raw projections, so project the pooled
+        # outputs the same way get_*_features does.
+        image_features = model.visual_projection(outputs.vision_model_output.pooler_output)
+        text_features = model.text_projection(outputs.text_model_output.pooler_output)
+    return image_features.float(), text_features.float()
+
+def fallback_joint_embeddings(embeddings, joint, pixel_values, texts):
+    # Separate passes with raw projections, as the joint pass returns; if one
+    # modality fails too, the row is searched with the one that is left.
+    image_features = text_features = [None] * len(joint)
     try:
-        if isinstance(image, str):
-            response = requests.get(image)
-            image = Image.open(BytesIO(response.content))
-        inputs = processor(images=image, return_tensors="pt", padding=True)
-        with torch.no_grad():
-            image_features = model.get_image_features(**inputs)
-        return image_features.cpu().numpy().flatten()
+        image_features = get_image_embeddings(torch.cat([pixel_values[i] for i in joint]), normalize=False)
     except Exception as e:
         print(f"Error processing image: {str(e)}")
-        return None
-
-def get_text_embedding(text):
     try:
-        truncated_text = truncate_text(text)
-        inputs = processor(text=truncated_text, return_tensors="pt", padding=True, truncation=True, max_length=77)
-        with torch.no_grad():
-            text_features = model.get_text_features(**inputs)
-        return text_features.cpu().numpy().flatten()
+        text_features = get_text_embeddings([texts[i] for i in joint], normalize=False)
     except Exception as e:
         print(f"Error processing text: {str(e)}")
-        return None
+
+    for i, image_embedding, text_embedding in zip(joint, image_features, text_features):
+        if image_embedding is None and text_embedding is not None:
+            text_embedding = F.normalize(text_embedding, dim=-1)
+        elif text_embedding is None and image_embedding is not None:
+            image_embedding = F.normalize(image_embedding, dim=-1)
+        embeddings[i] = (image_embedding, text_embedding)
+
+def get_query_embeddings(images, texts):
+    # Queries are grouped by which inputs they have, so a whole batch costs at
+    # most one forward pass per group (image+text, image only, text only).
+    pixel_values = {}
+    for i, image in enumerate(images):
+        if image is not None:
+            try:
+                pixel_values[i] = preprocess_image(load_image(image))
+            except Exception as e:
+                print(f"Error processing image: {str(e)}")
+    has_text = [i for i, text in enumerate(texts) if text and text.strip()]
+
+    embeddings = [(None, None)] * len(images)
+    joint = [i for i in has_text if i in pixel_values]
+    image_only = [i for i in pixel_values if i not in has_text]
+    text_only = [i for i in has_text if i not in pixel_values]
+
+    if joint:
+        try:
+            image_features, text_features = get_joint_embeddings(
+                torch.cat([pixel_values[i] for i in joint]), [texts[i] for i in joint]
+            )
+            for i, image_embedding, text_embedding in zip(joint, image_features, text_features):
+                embeddings[i] = (image_embedding, text_embedding)
+        except Exception as e:
+            print(f"Error processing image and text: {str(e)}")
+            fallback_joint_embeddings(embeddings, joint, pixel_values, texts)
+
+    if image_only:
+        try:
+            image_features = get_image_embeddings(torch.cat([pixel_values[i] for i in image_only]))
+            for i, image_embedding in zip(image_only, image_features):
+                embeddings[i] = (image_embedding, None)
+        except Exception as e:
+            print(f"Error processing image: {str(e)}")
+
+    for i in text_only:
+        if texts[i] in TEXT_EMB_CACHE:
+            embeddings[i] = (None, TEXT_EMB_CACHE[texts[i]])
+    uncached = [i for i in text_only if texts[i] not in TEXT_EMB_CACHE]
+    if uncached:
+        try:
+            text_features = get_text_embeddings([texts[i] for i in uncached])
+            for i, text_embedding in zip(uncached, text_features):
+                embeddings[i] = (None, text_embedding)
+        except Exception as e:
+            print(f"Error processing text: {str(e)}")
+
+    return embeddings
 
 def search_products(gender, image=None, text=None):
+    return search_products_batch([gender], [image], [text])[0]
+
+def search_products_batch(genders, images, texts):
+    embeddings = get_query_embeddings(images, texts)
+    return [
+        search_embeddings(gender, image_embedding, text_embedding)
+        for gender, (image_embedding, text_embedding) in zip(genders, embeddings)
+    ]
+
+def search_embeddings(gender, image_embedding, text_embedding):
     try:
         if gender == "Male":
-            index = index_male
+            indexes = indexes_male
             metadata = metadata_male
         else:
-            index = index_female
+            indexes = indexes_female
             metadata = metadata_female
         
-        image_embedding = get_image_embedding(image) if image is not None else None
-        text_embedding = get_text_embedding(text) if text and text.strip() else None
-        
         if image_embedding is not None and text_embedding is not None:
-            query_embedding = np.concatenate([image_embedding, text_embedding])
+            key = "both"
         elif image_embedding is not None:
-            text_embedding = np.zeros(512)
-            query_embedding = np.concatenate([image_embedding, text_embedding])
+            key = "image"
         elif text_embedding is not None:
-            image_embedding = np.zeros(512)
-            query_embedding = np.concatenate([image_embedding, text_embedding])
+            key = "text"
         else:
             return "Please provide at least an image or text"
+        index = indexes[key]
         
-        query_embedding = query_embedding.astype('float32').reshape(1, -1)
-        faiss.normalize_L2(query_embedding)
-        
-        scores, indices = index.search(query_embedding, 3)
+        with _QUERY_LOCK:
+            query_embedding = _QUERY_BUFS[key]
+            if key == "both":
+                # Raw projections, so the image/text balance matches the indexed
+                # vectors; normalize the concatenation as a whole.
+                query_embedding[0, :EMBED_DIM] = image_embedding
+                query_embedding[0, EMBED_DIM:] = text_embedding
+                query_embedding.div_(query_embedding.norm(dim=1, keepdim=True))
+            elif key == "image":
+                query_embedding[0] = image_embedding
+            else:
+                query_embedding[0] = text_embedding
+            if not hasattr(index, "getDevice"):
+                query_embedding = query_embedding.cpu()
+            scores, indices = index.search(query_embedding, 3)
+        scores, indices = scores.tolist(), indices.tolist()
         results = []
         for i, (score, idx) in enumerate(zip(scores[0], indices[0])):
-            if idx < len(metadata):
-                product = metadata[idx]
+            if 0 <= idx < len(metadata):
+                product = metadata.slice(idx, 1).to_pylist()[0]
+                combined_text = product.get('combined_text', '')
                 results.append({
                     "rank": i + 1,
                     "score": float(score),
@@ -94,7 +318,7 @@ def search_products(gender, image=None, text=None):
                     "price": product.get('price_sp', ''),
                     "image_url": product.get('image_url', ''),
                     "pdp_url": product.get('pdp_url', ''),
-                    "combined_text": product.get('combined_text', '')[:100] + "..." if len(product.get('combined_text', '')) > 100 else product.get('combined_text', '')
+                    "combined_text": combined_text[:100] + "..." if len(combined_text) > 100 else combined_text
                 })
         return results
     except Exception as e:
@@ -136,25 +360,49 @@ def format_results(results):
 """
     return formatted
 
+_IMG_POOL = ThreadPoolExecutor(max_workers=8)
+
+# Gallery shows 3 columns, so results are cached as thumbnails (<1 MB each)
+# rather than full-resolution photos.
+GALLERY_THUMB_SIZE = 512
+
+@lru_cache(maxsize=256)
+def fetch_image(url):
+    response = _SESSION.get(url, timeout=HTTP_TIMEOUT)
+    img = Image.open(BytesIO(response.content))
+    img.draft("RGB", (GALLERY_THUMB_SIZE, GALLERY_THUMB_SIZE))
+    img.thumbnail((GALLERY_THUMB_SIZE, GALLERY_THUMB_SIZE), Image.BICUBIC)
+    return img
+
+def _fetch_one(product):
+    try:
+        img = fetch_image(product['image_url'])
+        return (img, f"#{product['rank']}: {product['title'][:30]}...")
+    except:
+        blank_img = Image.new('RGB', (100, 100), color='white')
+        return (blank_img, f"#{product['rank']}: Cannot load image")
+
 def display_images(results):
     if isinstance(results, str):
         return []
-    images = []
-    for product in results:
-        try:
-            response = requests.get(product['image_url'])
-            img = Image.open(BytesIO(response.content))
-            images.append((img, f"#{product['rank']}: {product['title'][:30]}..."))
-        except:
-            blank_img = Image.new('RGB', (100, 100), color='white')
-            images.append((blank_img, f"#{product['rank']}: Cannot load image"))
-    return images
+    futures = [_IMG_POOL.submit(_fetch_one, product) for product in results]
+    return [future.result() for future in futures]
 
-def inference_interface(gender, image, text):
-    results = search_products(gender, image, text)
-    formatted_html = format_results(results)
-    images = display_images(results)
-    return formatted_html, images
+def inference_interface(genders, images, texts):
+    # Registered with batch=True: Gradio passes every request waiting in the
+    # queue (up to MAX_BATCH_SIZE) as parallel lists.
+    all_results = search_products_batch(genders, images, texts)
+    formatted_html = [format_results(results) for results in all_results]
+    galleries = [display_images(results) for results in all_results]
+    return formatted_html, galleries
+
+example_texts = [example_text for _, _, example_text in EXAMPLES if example_text]
+TEXT_EMB_CACHE.update(zip(example_texts, get_text_embeddings(example_texts)))
+if device == "cuda":
+    # Compile before serving; batch size 1 is specialized apart from larger batches.
+    for warmup_size in (1, 2):
+        get_image_embeddings(torch.zeros(warmup_size, 3, CLIP_IMAGE_SIZE, CLIP_IMAGE_SIZE, dtype=model.dtype, device=device))
+        get_text_embeddings([""] * warmup_size)
 
 custom_css = """
 .product-card {
@@ -270,6 +518,10 @@ with gr.Blocks(title="Fashion Product Search", css=custom_css) as demo:
                 lines=3
             )
             search_btn = gr.Button("Search", variant="primary", size="lg")
+            gr.Examples(
+                examples=EXAMPLES,
+                inputs=[gender_radio, image_input, text_input]
+            )
             gr.Markdown("""
             <div class="instructions">
             Instructions:<br/>
@@ -297,16 +549,24 @@ with gr.Blocks(title="Fashion Product Search", css=custom_css) as demo:
     search_btn.click(
         fn=inference_interface,
         inputs=[gender_radio, image_input, text_input],
-        outputs=[html_output, gallery_output]
+        outputs=[html_output, gallery_output],
+        batch=True,
+        max_batch_size=MAX_BATCH_SIZE
     )
     
     text_input.submit(
         fn=inference_interface,
         inputs=[gender_radio, image_input, text_input],
-        outputs=[html_output, gallery_output]
+        outputs=[html_output, gallery_output],
+        batch=True,
+        max_batch_size=MAX_BATCH_SIZE
     )
 
 if __name__ == "__main__":
+    demo.queue(
+        max_size=64,
+        default_concurrency_limit=1 if torch.cuda.is_available() else 4
+    )
     demo.launch(
         server_name="0.0.0.0" if torch.cuda.is_available() else "127.0.0.1",
         share=False,
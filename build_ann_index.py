@@ -0,0 +1,67 @@
+import sys
+import numpy as np
+import faiss
+
+EMBED_DIM = 512
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+IVF_NLIST = 256
+IVF_NPROBE = 16
+PQ_M = 64
+PQ_NBITS = 8
+
+
+def build_hnsw(vectors):
+    index = faiss.IndexHNSWFlat(vectors.shape[1], HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    index.add(vectors)
+    index.hnsw.efSearch = HNSW_EF_SEARCH
+    return index
+
+
+def build_ivfpq(vectors):
+    n, dim = vectors.shape
+    # Cap nlist near 4*sqrt(N) so small catalogs do not get near-empty lists.
+    nlist = max(1, min(IVF_NLIST, int(4 * np.sqrt(n))))
+    quantizer = faiss.IndexFlatIP(dim)
+    index = faiss.IndexIVFPQ(quantizer, dim, nlist, PQ_M, PQ_NBITS, faiss.METRIC_INNER_PRODUCT)
+    index.train(vectors)
+    index.add(vectors)
+    index.nprobe = min(IVF_NPROBE, nlist)
+    return index
+
+
+BUILDERS = {
+    "hnsw": build_hnsw,
+    "ivfpq": build_ivfpq,
+}
+
+
+def build(name, kind):
+    flat_index = faiss.read_index(f"{name}.faiss")
+    vectors = flat_index.reconstruct_n(0, flat_index.ntotal)
+    slabs = {
+        "both": vectors,
+        "image": vectors[:, :EMBED_DIM],
+        "text": vectors[:, EMBED_DIM:],
+    }
+    for key, slab in slabs.items():
+        index = BUILDERS[kind](np.ascontiguousarray(slab))
+        path = f"{name}_{key}_{kind}.faiss"
+        faiss.write_index(index, path)
+        print(f"Saved {path} ({index.ntotal} vectors, dim {index.d})")
+
+
+def main():
+    kind = sys.argv[1] if len(sys.argv) > 1 else "hnsw"
+    if kind not in BUILDERS:
+        print(f"Unknown index type: {kind} (choose from {', '.join(BUILDERS)})")
+        sys.exit(1)
+
+    for name in ("male", "female"):
+        build(name, kind)
+
+
+if __name__ == "__main__":
+    main()
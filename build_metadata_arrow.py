@@ -0,0 +1,33 @@
+import json
+import pyarrow as pa
+
+COLUMNS = ["pdp_title", "category", "price_sp", "image_url", "pdp_url", "combined_text"]
+
+
+def read_metadata_json(name):
+    with open(f"{name}_metadata.json", "r", encoding="utf-8") as f:
+        metadata = json.load(f)
+
+    return pa.table({
+        column: pa.array([product.get(column, '') for product in metadata], type=pa.string())
+        for column in COLUMNS
+    })
+
+
+def build(name):
+    table = read_metadata_json(name)
+    path = f"{name}_metadata.arrow"
+    # Uncompressed Arrow IPC, so the app can memory-map it and read rows in place.
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    print(f"Saved {path} ({table.num_rows} rows)")
+
+
+def main():
+    for name in ("male", "female"):
+        build(name)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,9 @@ from PIL import Image
 import numpy as np
 import os
 
+# Giới hạn trên khi dò batch size, tránh cấp phát sát ngưỡng OOM
+MAX_IMAGE_BATCH_SIZE = 256
+
 class FashionCLIPInference:
     def __init__(self, model_path="best_fashion_clip_english"):
         """
@@ -21,44 +24,157 @@ class FashionCLIPInference:
         self.model.to(self.device)
         self.model.eval()
         
+        # Batch size lớn nhất đã dò được cho get_multiple_image_embeddings
+        self._image_batch_size = None
+        
         print("Fashion CLIP model loaded successfully!")
         print(f"Model device: {self.device}")
     
+    def _embed_pil(self, image):
+        """
+        Lấy embedding từ một PIL Image (không kiểm tra kiểu đầu vào)
+        
+        Args:
+            image: PIL Image
+        
+        Returns:
+            image_embedding: numpy array shape (1, embedding_dim)
+        """
+        # Preprocess ảnh
+        inputs = self.processor(images=image, return_tensors="pt")
+        pixel_values = inputs['pixel_values'].to(self.device)
+        
+        # Lấy embedding
+        with torch.inference_mode():
+            image_features = self.model.get_image_features(pixel_values=pixel_values)
+            # Chuẩn hóa embedding
+            image_embedding = image_features / image_features.norm(dim=-1, keepdim=True)
+        
+        return image_embedding.cpu().numpy().astype('float32')
+    
+    def embed_path(self, path):
+        """
+        Lấy embedding từ đường dẫn ảnh
+        
+        Args:
+            path: Đường dẫn ảnh
+        
+        Returns:
+            image_embedding: numpy array shape (1, embedding_dim)
+        """
+        try:
+            return self._embed_pil(Image.open(path).convert('RGB'))
+        except Exception as e:
+            print(f"Error getting image embedding: {e}")
+            return None
+    
     def get_image_embedding(self, image_input):
         """
         Lấy embedding từ ảnh
         
         Args:
-            image_input: Có thể là đường dẫn ảnh, PIL Image, hoặc tensor
+            image_input: Có thể là đường dẫn ảnh hoặc PIL Image
         
         Returns:
             image_embedding: numpy array shape (1, embedding_dim)
         """
+        # Chọn nhánh một lần rồi gọi thẳng hàm tương ứng
+        if isinstance(image_input, str):
+            return self.embed_path(image_input)
+        
         try:
-            # Xử lý đầu vào ảnh
-            if isinstance(image_input, str):
-                # Nếu là đường dẫn
-                image = Image.open(image_input).convert('RGB')
-            elif isinstance(image_input, Image.Image):
-                # Nếu là PIL Image
-                image = image_input
-            else:
+            if not isinstance(image_input, Image.Image):
                 raise ValueError("image_input phải là đường dẫn hoặc PIL Image")
+            return self._embed_pil(image_input)
+        except Exception as e:
+            print(f"Error getting image embedding: {e}")
+            return None
+    
+    def _image_features_batch(self, images):
+        """
+        Chạy image encoder cho một batch PIL Image (chưa chuẩn hóa)
+        """
+        inputs = self.processor(images=images, return_tensors="pt")
+        pixel_values = inputs['pixel_values'].to(self.device)
+        
+        with torch.inference_mode(), torch.autocast(device_type=self.device.type, dtype=torch.bfloat16, enabled=self.device.type == "cuda"):
+            image_features = self.model.get_image_features(pixel_values=pixel_values)
+        
+        return image_features.float()
+    
+    def _find_image_batch_size(self, images, start=8):
+        """
+        Dò batch size: nhân đôi từ `start` cho đến khi CUDA OOM hoặc chạm
+        MAX_IMAGE_BATCH_SIZE. Mỗi lần thử chạy trên đoạn ảnh kế tiếp nên kết
+        quả của các lần thử thành công được giữ lại, không phải encode lại.
+        
+        Args:
+            images: List các PIL Image cần encode
+            start: batch size khởi đầu
+        
+        Returns:
+            batch_size: batch size lớn nhất chạy được
+            features: List tensor features của các ảnh đã encode khi dò
+            done: Số ảnh đầu tiên trong `images` đã được encode
+        """
+        if self._image_batch_size is not None:
+            return self._image_batch_size, [], 0
+        if self.device.type != "cuda":
+            return start, [], 0
+        
+        batch_size = min(start, MAX_IMAGE_BATCH_SIZE)
+        best = None
+        features = []
+        done = 0
+        while done < len(images):
+            batch = images[done:done + batch_size]
+            try:
+                features.append(self._image_features_batch(batch))
+            except torch.cuda.OutOfMemoryError:
+                torch.cuda.empty_cache()
+                # Chỉ ghi nhớ khi đã chạm giới hạn bộ nhớ thật sự
+                self._image_batch_size = best or 1
+                return self._image_batch_size, features, done
+            done += len(batch)
+            if len(batch) < batch_size:
+                # Hết ảnh trước khi thử được trọn batch này
+                break
+            best = batch_size
+            if batch_size >= MAX_IMAGE_BATCH_SIZE:
+                self._image_batch_size = best
+                return best, features, done
+            batch_size = min(batch_size * 2, MAX_IMAGE_BATCH_SIZE)
+        return best or batch_size, features, done
+    
+    def get_multiple_image_embeddings(self, images, batch_size=None):
+        """
+        Lấy embedding cho nhiều ảnh, chạy theo từng batch
+        
+        Args:
+            images: List các PIL Image
+            batch_size: Số ảnh mỗi batch (None = tự dò theo bộ nhớ GPU)
+        
+        Returns:
+            image_embeddings: numpy array shape (n_images, embedding_dim)
+        """
+        try:
+            features, done = [], 0
+            if batch_size is None:
+                batch_size, features, done = self._find_image_batch_size(images)
             
-            # Preprocess ảnh
-            inputs = self.processor(images=image, return_tensors="pt")
-            pixel_values = inputs['pixel_values'].to(self.device)
-            
-            # Lấy embedding
-            with torch.no_grad():
-                image_features = self.model.get_image_features(pixel_values=pixel_values)
-                # Chuẩn hóa embedding
-                image_embedding = image_features / image_features.norm(dim=-1, keepdim=True)
+            # Mỗi batch là một tensor (B, 3, 224, 224) qua encoder một lần
+            features += [
+                self._image_features_batch(images[i:i + batch_size])
+                for i in range(done, len(images), batch_size)
+            ]
+            image_features = torch.cat(features)
+            # Chuẩn hóa embeddings
+            image_embeddings = image_features / image_features.norm(dim=-1, keepdim=True)
             
-            return image_embedding.cpu().numpy().astype('float32')
+            return image_embeddings.cpu().numpy().astype('float32')
             
         except Exception as e:
-            print(f"Error getting image embedding: {e}")
+            print(f"Error getting multiple image embeddings: {e}")
             return None
     
     def get_text_embedding(self, text):
@@ -78,7 +194,7 @@ class FashionCLIPInference:
             attention_mask = inputs['attention_mask'].to(self.device)
             
             # Lấy embedding
-            with torch.no_grad():
+            with torch.inference_mode():
                 text_features = self.model.get_text_features(
                     input_ids=input_ids,
                     attention_mask=attention_mask
@@ -109,7 +225,7 @@ class FashionCLIPInference:
             attention_mask = inputs['attention_mask'].to(self.device)
             
             # Lấy embeddings
-            with torch.no_grad():
+            with torch.inference_mode():
                 text_features = self.model.get_text_features(
                     input_ids=input_ids,
                     attention_mask=attention_mask
@@ -1,207 +1,237 @@
 #!/usr/bin/env python3
 
-import json
+import os
+import re
 import time
 import random
 import sys
+import asyncio
+import threading
+from contextlib import closing
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime
+from functools import cached_property
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterator, Optional, Tuple
+from urllib import robotparser
+from urllib.parse import urljoin, urlsplit
+from urllib.request import Request, urlopen
 
+import aiohttp
+import orjson
 import undetected_chromedriver as uc
+from lxml import etree, html as lxml_html
+from lxml.cssselect import CSSSelector
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from bs4 import BeautifulSoup
 
-
-class LazadaCrawler:
-
-    def __init__(self):
-        self.results = []
-        self.failed_urls = []
-        self.driver = None
-
-    def delay(self, min_sec: float, max_sec: float):
-        time.sleep(random.uniform(min_sec, max_sec))
-
-    def detect_captcha(self) -> bool:
-        try:
-            captcha_frames = self.driver.find_elements(By.CSS_SELECTOR, "iframe[src*='captcha']")
-            return len(captcha_frames) > 0
-        except:
-            return False
-
-    def handle_captcha(self):
-        print('   CAPTCHA detected!')
-        print('   Please solve the CAPTCHA manually...')
-        print('   The crawler will wait up to 60 seconds')
-
-        max_wait_time = 60
-        start_time = time.time()
-
-        while time.time() - start_time < max_wait_time:
-            self.delay(2, 3)
-
-            if not self.detect_captcha():
-                print('   CAPTCHA solved!')
-                self.delay(2, 3)
-                return
-
-        raise Exception('CAPTCHA solving timeout')
-
-    def scroll_page(self):
-        try:
-            scroll_height = self.driver.execute_script("return document.body.scrollHeight")
-            current_position = 0
-            step = 200
-
-            while current_position < scroll_height:
-                self.driver.execute_script(f"window.scrollTo(0, {current_position})")
-                current_position += step
-                time.sleep(0.1)
-
-            self.driver.execute_script("window.scrollTo(0, 0)")
-            self.delay(1, 2)
-        except Exception as e:
-            print(f'   Scroll error: {e}')
-
-    def get_product_links(self, category_url: str, max_products: int = 50) -> List[str]:
-        print(f'   Loading category: {category_url}')
-
-        try:
-            self.driver.get(category_url)
-            self.delay(3, 5)
-
-            if self.detect_captcha():
-                self.handle_captcha()
-
-            print('   Scrolling to load products...')
-            for _ in range(5):
-                self.driver.execute_script("window.scrollTo(0, document.body.scrollHeight)")
-                self.delay(1, 2)
-
-            html = self.driver.page_source
-            soup = BeautifulSoup(html, 'html.parser')
-
-            print('   Extracting product links...')
-
-            links = []
-            seen = set()
-
-            selectors = [
-                'a[href*="/products/"]',
-                '.Bm3ON',
-                '[data-tracking="product-card"]',
-                '.qmXQo'
-            ]
-
-            for selector in selectors:
-                elements = soup.select(selector)
-
-                for el in elements:
-                    href = el.get('href', '')
-
-                    if href and '/products/' in href and href not in seen:
-                        if href.startswith('//'):
-                            full_url = f'https:{href}'
-                        elif href.startswith('/'):
-                            full_url = f'https://www.lazada.vn{href}'
-                        elif not href.startswith('http'):
-                            full_url = f'https://www.lazada.vn/{href}'
-                        else:
-                            full_url = href
-
-                        clean_url = full_url.split('?')[0]
-
-                        if clean_url not in seen and '/products/' in clean_url:
-                            links.append(clean_url)
-                            seen.add(clean_url)
-
-                if len(links) >= max_products:
-                    break
-
-            product_links = links[:max_products]
-            print(f'   Found {len(product_links)} product links\n')
-
-            return product_links
-
-        except Exception as e:
-            print(f'   Error getting product links: {e}')
-            return []
-
-    def get_title(self, soup: BeautifulSoup) -> str:
+HTTP_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept-Language': 'vi-VN,vi;q=0.9,en-US;q=0.8,en;q=0.7',
+}
+LAZADA_BASE_URL = 'https://www.lazada.vn/'
+HTTP_CONCURRENCY = 10
+HOST_DELAY_SEC = 1.5
+BROWSER_WORKERS = 3
+WRITE_BATCH_SIZE = 16
+# Set CRAWLER_HEADLESS=0 to get a visible browser, e.g. to solve CAPTCHAs by hand.
+HEADLESS = os.environ.get('CRAWLER_HEADLESS', '1') != '0'
+# Chrome refuses to start its sandbox as root, and containers often have a tiny
+# /dev/shm; everywhere else the sandbox stays on. CRAWLER_NO_SANDBOX=1 forces it.
+NO_SANDBOX = (hasattr(os, 'geteuid') and os.geteuid() == 0) or os.environ.get('CRAWLER_NO_SANDBOX') == '1'
+CHROME_PROFILE_DIR = Path('.chrome_profile').absolute()
+CHROME_CACHE_DIR = Path('.chrome_cache').absolute()
+CHROME_DISK_CACHE_BYTES = 500 * 1024 * 1024
+# Media and tracker requests the crawler never reads; blocked through CDP.
+BLOCKED_URL_PATTERNS = [
+    '*.jpg', '*.jpeg', '*.png', '*.webp', '*.gif', '*.svg', '*.mp4', '*.woff', '*.woff2',
+    '*googletagmanager*', '*google-analytics*', '*facebook*', '*hotjar*', '*doubleclick*',
+]
+LOAD_MORE_ROUNDS = 5
+LOAD_MORE_WAIT_MS = 2000
+
+# Both scrolls run inside the page as one async script, so the driver makes a
+# single round trip instead of one per scroll step.
+_SCROLL_SCRIPT = '''
+const done = arguments[arguments.length - 1];
+const height = document.body.scrollHeight;
+let y = 0;
+(function step() {
+    window.scrollTo(0, y);
+    y += 400;
+    if (y < height) {
+        requestAnimationFrame(step);
+    } else {
+        window.scrollTo(0, 0);
+        done();
+    }
+})();
+'''
+_LOAD_MORE_SCRIPT = '''
+const done = arguments[arguments.length - 1];
+let rounds = arguments[0];
+const maxWait = arguments[1];
+(function next() {
+    if (rounds-- <= 0) return done();
+    const height = document.body.scrollHeight;
+    const start = performance.now();
+    window.scrollTo(0, height);
+    (function wait() {
+        if (document.body.scrollHeight > height || performance.now() - start > maxWait) {
+            next();
+        } else {
+            requestAnimationFrame(wait);
+        }
+    })();
+})();
+'''
+
+
+def css(selector: str) -> CSSSelector:
+    return CSSSelector(selector, translator='html')
+
+
+# Selectors are compiled to XPath once here instead of on every product.
+_TITLE_SELECTORS = [css(s) for s in ('.pdp-product-title', 'h1', '.pdp-mod-product-badge-title')]
+_PRICE_CONTAINER_SEL = css('.pdp-product-price')
+_ORIGIN_PRICE_SEL = css('.origin-block span')
+_SALE_PRICE_SEL = css('.pdp-price_type_normal')
+_ANY_PRICE_SEL = css('[class*="price"]')
+_DELIVERY_SEL = css('.delivery-option-item__time')
+_DESC_ARTICLE_SEL = css('.pdp-product-detail article.lzd-article')
+_CAPTCHA_SEL = css("iframe[src*='captcha']")
+_ROOT_SEL = css('#root')
+_JSON_LD_PATTERN = re.compile(r'<script[^>]*\stype=["\']application/ld\+json["\'][^>]*>(.*?)</script>', re.S | re.I)
+_TEXT_XPATH = etree.XPath('.//text()')
+_PRICE_PATTERN = re.compile(r'[\d\.,]+\s*₫')
+_PRICE_STRIP = re.compile(r'Rp|[₫,.\s]')
+_DESC_NOISE = re.compile(r'\n|- ')
+# Same matches as the CSS union 'a[href*="/products/"], .Bm3ON[href*=...], ...',
+# written as one XPath step with OR'd predicates: lxml evaluates a '|' union
+# branch by branch and then re-sorts the merged node set, this walks once.
+_PRODUCT_LINK_SEL = etree.XPath(
+    "descendant-or-self::*[@href and contains(@href, '/products/')]"
+    "[self::a"
+    " or contains(concat(' ', normalize-space(@class), ' '), ' Bm3ON ')"
+    " or @data-tracking = 'product-card'"
+    " or contains(concat(' ', normalize-space(@class), ' '), ' qmXQo ')]"
+)
+
+
+def text_of(element, strip: bool = False) -> str:
+    if strip:
+        return ''.join(text.strip() for text in _TEXT_XPATH(element))
+    return element.text_content()
+
+
+def first(elements: list):
+    return elements[0] if elements else None
+
+
+def product_url(href: str) -> str:
+    return urljoin(LAZADA_BASE_URL, href).split('?', 1)[0]
+
+
+class ParsedPage:
+    # Extracted fields are computed once per page and reused by later reads.
+    # The DOM is only built when a field actually needs it; JSON-LD is read
+    # straight from the HTML.
+
+    def __init__(self, html: str):
+        self.html = html
+
+    @cached_property
+    def tree(self) -> lxml_html.HtmlElement:
+        return lxml_html.fromstring(self.html)
+
+    @cached_property
+    def title(self) -> str:
         try:
-            selectors = ['.pdp-product-title', 'h1', '.pdp-mod-product-badge-title']
-
-            for selector in selectors:
-                title_el = soup.select_one(selector)
-                if title_el:
-                    title = title_el.get_text(strip=True)
+            for selector in _TITLE_SELECTORS:
+                title_el = first(selector(self.tree))
+                if title_el is not None:
+                    title = text_of(title_el, strip=True)
                     if title and len(title) > 10:
                         return title
             return ''
         except:
             return ''
 
-    def get_prices(self, soup: BeautifulSoup) -> Dict[str, str]:
+    @cached_property
+    def prices(self) -> Dict[str, str]:
         regular_price = ''
         sale_price = ''
 
         try:
-            price_container = soup.select_one('.pdp-product-price')
+            price_container = first(_PRICE_CONTAINER_SEL(self.tree))
 
-            if price_container:
-                origin_block = price_container.select_one('.origin-block span')
-                if origin_block:
-                    regular_price = origin_block.get_text().replace('Rp', '').replace('₫', '').replace(',', '').replace('.', '').replace(' ', '').strip()
+            if price_container is not None:
+                origin_block = first(_ORIGIN_PRICE_SEL(price_container))
+                if origin_block is not None:
+                    regular_price = _PRICE_STRIP.sub('', text_of(origin_block))
 
-                sale_price_el = price_container.select_one('.pdp-price_type_normal')
-                if sale_price_el:
-                    sale_price = sale_price_el.get_text().replace('Rp', '').replace('₫', '').replace(',', '').replace('.', '').replace(' ', '').strip()
+                sale_price_el = first(_SALE_PRICE_SEL(price_container))
+                if sale_price_el is not None:
+                    sale_price = _PRICE_STRIP.sub('', text_of(sale_price_el))
 
             if not regular_price and not sale_price:
-                price_elements = soup.select('[class*="price"]')
+                price_elements = _ANY_PRICE_SEL(self.tree)
                 if price_elements:
-                    price_text = price_elements[0].get_text()
+                    price_text = text_of(price_elements[0])
 
-                    import re
-                    price_matches = re.findall(r'[\d\.,]+\s*₫', price_text)
+                    price_matches = _PRICE_PATTERN.findall(price_text)
 
                     if price_matches and len(price_matches) >= 1:
-                        sale_price = price_matches[0].replace('₫', '').replace(',', '').replace('.', '').replace(' ', '').strip()
+                        sale_price = _PRICE_STRIP.sub('', price_matches[0])
 
                         if len(price_matches) >= 2:
-                            regular_price = price_matches[1].replace('₫', '').replace(',', '').replace('.', '').replace(' ', '').strip()
+                            regular_price = _PRICE_STRIP.sub('', price_matches[1])
         except:
             pass
 
         return {'regularPrice': regular_price, 'salePrice': sale_price}
 
-    def get_delivery_time(self, soup: BeautifulSoup) -> str:
+    @cached_property
+    def delivery_time(self) -> str:
         try:
-            delivery_el = soup.select_one('.delivery-option-item__time')
-            if delivery_el:
-                return delivery_el.get_text(strip=True)
+            delivery_el = first(_DELIVERY_SEL(self.tree))
+            if delivery_el is not None:
+                return text_of(delivery_el, strip=True)
             return ''
         except:
             return ''
 
-    def get_description(self, soup: BeautifulSoup) -> str:
+    @cached_property
+    def description(self) -> str:
         try:
-            desc_article = soup.select_one('.pdp-product-detail article.lzd-article')
-            if desc_article:
-                paragraphs = []
-                for p in desc_article.select('p'):
-                    text = p.get_text().replace('\n', '').replace('- ', '').strip()
-                    if text:
-                        paragraphs.append(text)
-                return ', '.join(paragraphs)
+            desc_article = first(_DESC_ARTICLE_SEL(self.tree))
+            if desc_article is not None:
+                paragraphs = (_DESC_NOISE.sub('', p.text_content()).strip() for p in desc_article.iter('p'))
+                return ', '.join(text for text in paragraphs if text)
             return ''
         except:
             return ''
 
-    def get_json_ld_data(self, soup: BeautifulSoup) -> Dict:
+    @cached_property
+    def json_ld_raw(self) -> Dict:
+        match = _JSON_LD_PATTERN.search(self.html)
+        if match is None:
+            return {}
+
+        raw = match.group(1)
+        try:
+            try:
+                json_data = orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                # Some pages put raw newlines inside JSON strings, which is invalid JSON.
+                json_data = orjson.loads(raw.replace('\n', ''))
+        except Exception as e:
+            print(f'   Error parsing JSON-LD: {e}')
+            return {}
+
+        return json_data if isinstance(json_data, dict) else {}
+
+    @cached_property
+    def json_ld(self) -> Dict:
         result = {
             'name': '',
             'description': '',
@@ -212,11 +242,7 @@ class LazadaCrawler:
         }
 
         try:
-            json_ld_script = soup.find('script', type='application/ld+json')
-            if not json_ld_script:
-                return result
-
-            json_data = json.loads(json_ld_script.string.replace('\n', ''))
+            json_data = self.json_ld_raw
 
             if 'name' in json_data:
                 result['name'] = json_data['name']
@@ -251,60 +277,382 @@ class LazadaCrawler:
 
         return result
 
-    def crawl_product(self, url: str) -> Optional[Dict]:
-        start_time = time.time()
-        print(f'   Crawling: {url}')
 
+def is_blocked(tree: lxml_html.HtmlElement) -> bool:
+    return bool(_CAPTCHA_SEL(tree)) or not _ROOT_SEL(tree)
+
+
+def extract_product(html: str, check_blocked: bool = True) -> Optional[Dict]:
+    # Pure HTML -> fields step, kept at module level so it can run in a
+    # worker process. None means the page is blocked and needs the browser.
+    page = ParsedPage(html)
+
+    if check_blocked and is_blocked(page.tree):
+        return None
+
+    root_element = first(_ROOT_SEL(page.tree))
+    if root_element is None:
+        raise Exception('Content not found - possible bot detection')
+
+    json_ld_data = page.json_ld
+    prices = page.prices
+    final_title = page.title or json_ld_data['name']
+    final_description = page.description or json_ld_data['description']
+    final_regular_price = prices['regularPrice'] or json_ld_data['priceFromJson']
+    sale_price = prices['salePrice']
+    delivery_time = page.delivery_time
+
+    return {
+        'pdp_title_value': final_title,
+        'price_rp': final_regular_price,
+        'price_sp': sale_price,
+        'delivery_time': delivery_time,
+        'pdp_desc_value': final_description,
+        'web_pid': json_ld_data['productId'],
+        'vosa': json_ld_data['stock'],
+        'pdp_image_url': json_ld_data['imageUrl'],
+        'pdp_image_count': '1' if json_ld_data['imageUrl'] else '0',
+    }
+
+
+def extract_timed(html: str, start_time: float, check_blocked: bool = True) -> Optional[Tuple[Dict, float]]:
+    # Runs in a worker process; start_time is the wall-clock time the fetch
+    # began, so the elapsed time covers fetch + parse for this product only.
+    fields = extract_product(html, check_blocked)
+    if fields is None:
+        return None
+    return fields, round(time.time() - start_time, 2)
+
+
+class LazadaCrawler:
+
+    def __init__(self, workers: int = BROWSER_WORKERS):
+        self.product_count = 0
+        self.failed_urls = []
+        self.timestamp = datetime.now().isoformat().replace(':', '-').replace('.', '-')
+        self.products_file = f'data/lazada_products_{self.timestamp}.jsonl'
+        self._out = None
+        self._pending: List[bytes] = []
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.parser_pool = ProcessPoolExecutor(max_workers=os.cpu_count())
+        self._local = threading.local()
+        self._drivers = []
+        self._drivers_lock = threading.Lock()
+        self._last_hit: Dict[str, float] = {}
+        self._robots: Dict[str, robotparser.RobotFileParser] = {}
+        self._hosts_lock = threading.Lock()
+        self._robots_lock = threading.Lock()
+
+    @property
+    def driver(self) -> uc.Chrome:
+        # Each worker thread lazily gets its own Chrome. Drivers are started one
+        # at a time: undetected_chromedriver patches and replaces its
+        # chromedriver binary at one fixed path, which concurrent starts race on.
+        driver = getattr(self._local, 'driver', None)
+        if driver is None:
+            with self._drivers_lock:
+                worker_index = len(self._drivers)
+                driver = self.new_driver(worker_index)
+                self._drivers.append(driver)
+            self._local.driver = driver
+        return driver
+
+    def write_product(self, product: Dict):
+        # Products are appended as JSON lines in small batches, so a crash
+        # loses at most WRITE_BATCH_SIZE - 1 of them.
+        self._pending.extend((orjson.dumps(product), b'\n'))
+        self.product_count += 1
+        if len(self._pending) >= 2 * WRITE_BATCH_SIZE:
+            self.flush_products()
+
+    def flush_products(self):
+        if not self._pending:
+            return
+        if self._out is None:
+            Path('data').mkdir(exist_ok=True)
+            self._out = os.open(self.products_file, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+        # One writev call per batch instead of a write + flush per product.
+        if hasattr(os, 'writev'):
+            written = os.writev(self._out, self._pending)
+        else:
+            written = os.write(self._out, b''.join(self._pending))
+
+        if written < sum(map(len, self._pending)):
+            remaining = b''.join(self._pending)[written:]
+            while remaining:
+                remaining = remaining[os.write(self._out, remaining):]
+        self._pending = []
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.parser_pool.shutdown(wait=True)
+        self.flush_products()
+        if self._out is not None:
+            os.close(self._out)
+            self._out = None
+        for driver in self._drivers:
+            if driver:
+                driver.quit()
+        if self._drivers:
+            print('\nBrowser closed')
+        self._drivers = []
+
+    def new_driver(self, worker_index: int = 0) -> uc.Chrome:
+        # Profiles persist across runs so HTTP cache, DNS and cookies stay warm.
+        # Chrome locks a profile, so every worker gets its own directory.
+        profile_dir = CHROME_PROFILE_DIR / f'worker-{worker_index}'
+        cache_dir = CHROME_CACHE_DIR / f'worker-{worker_index}'
+
+        options = uc.ChromeOptions()
+        options.page_load_strategy = 'eager'
+        options.add_argument('--window-size=1920,1080')
+        options.add_argument('--disable-blink-features=AutomationControlled')
+        options.add_argument('--ignore-certificate-errors')
+        options.add_argument('--ignore-ssl-errors=yes')
+        options.add_argument(f'--user-data-dir={profile_dir}')
+        options.add_argument(f'--disk-cache-dir={cache_dir}')
+        options.add_argument(f'--disk-cache-size={CHROME_DISK_CACHE_BYTES}')
+        # Only the DOM and JSON-LD are read, so images are never loaded.
+        options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+        if HEADLESS:
+            options.add_argument('--headless=new')
+            options.add_argument('--disable-gpu')
+        if NO_SANDBOX:
+            options.add_argument('--no-sandbox')
+            options.add_argument('--disable-dev-shm-usage')
+
+        driver = uc.Chrome(options=options)
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': BLOCKED_URL_PATTERNS})
+        driver.execute_cdp_cmd('Page.setDownloadBehavior', {'behavior': 'deny'})
+        driver.set_script_timeout(LOAD_MORE_ROUNDS * LOAD_MORE_WAIT_MS / 1000 + 30)
+        return driver
+
+    def delay(self, min_sec: float, max_sec: float):
+        time.sleep(random.uniform(min_sec, max_sec))
+
+    def reserve_host(self, url: str) -> float:
+        # Requests to one host, from HTTP or the browser, are spaced at least
+        # HOST_DELAY_SEC apart, or robots.txt's Crawl-delay if that is longer.
+        # The slot is reserved under the lock so workers do not fire together.
+        host = urlsplit(url).netloc
+        delay = max(HOST_DELAY_SEC, float(self.robots_for(url).crawl_delay('*') or 0))
+        with self._hosts_lock:
+            now = time.time()
+            wait = max(0.0, delay - (now - self._last_hit.get(host, 0.0)))
+            self._last_hit[host] = now + wait
+        return wait
+
+    def wait_for_host(self, url: str):
+        wait = self.reserve_host(url)
+        if wait:
+            time.sleep(wait)
+
+    async def wait_for_host_async(self, url: str):
+        wait = self.reserve_host(url)
+        if wait:
+            await asyncio.sleep(wait)
+
+    def robots_for(self, url: str) -> robotparser.RobotFileParser:
+        parts = urlsplit(url)
+        with self._robots_lock:
+            parser = self._robots.get(parts.netloc)
+            if parser is None:
+                parser = robotparser.RobotFileParser()
+                try:
+                    request = Request(f'{parts.scheme}://{parts.netloc}/robots.txt', headers=HTTP_HEADERS)
+                    with urlopen(request, timeout=10) as response:
+                        parser.parse(response.read().decode('utf-8', 'ignore').splitlines())
+                except Exception as e:
+                    print(f'   Could not read robots.txt for {parts.netloc}: {e}')
+                    parser.parse([])
+                self._robots[parts.netloc] = parser
+        return parser
+
+    def allowed_urls(self, urls: List[str]) -> List[str]:
+        allowed = []
+        for url in urls:
+            if self.robots_for(url).can_fetch('*', url):
+                allowed.append(url)
+            else:
+                print(f'   Skipped (robots.txt): {url}')
+        return allowed
+
+    def detect_captcha(self) -> bool:
         try:
-            self.driver.get(url)
+            captcha_frames = self.driver.find_elements(By.CSS_SELECTOR, "iframe[src*='captcha']")
+            return len(captcha_frames) > 0
+        except:
+            return False
 
-            WebDriverWait(self.driver, 20).until(
-                lambda d: d.execute_script('return document.readyState') == 'complete'
-            )
+    def handle_captcha(self):
+        print('   CAPTCHA detected!')
+        if HEADLESS:
+            raise Exception('CAPTCHA in headless mode - rerun with CRAWLER_HEADLESS=0 to solve it manually')
+        print('   Please solve the CAPTCHA manually...')
+        print('   The crawler will wait up to 60 seconds')
 
+        max_wait_time = 60
+        start_time = time.time()
+
+        while time.time() - start_time < max_wait_time:
+            self.delay(2, 3)
+
+            if not self.detect_captcha():
+                print('   CAPTCHA solved!')
+                self.delay(2, 3)
+                return
+
+        raise Exception('CAPTCHA solving timeout')
+
+    def scroll_page(self):
+        try:
+            self.driver.execute_async_script(_SCROLL_SCRIPT)
             self.delay(1, 2)
+        except Exception as e:
+            print(f'   Scroll error: {e}')
+
+    def get_product_links(self, category_url: str, max_products: int = 50) -> List[str]:
+        print(f'   Loading category: {category_url}')
+
+        try:
+            self.wait_for_host(category_url)
+            self.driver.get(category_url)
+            self.delay(3, 5)
 
             if self.detect_captcha():
                 self.handle_captcha()
-                WebDriverWait(self.driver, 15).until(
-                    lambda d: d.execute_script('return document.readyState') == 'complete'
-                )
 
-            self.scroll_page()
+            print('   Scrolling to load products...')
+            self.driver.execute_async_script(_LOAD_MORE_SCRIPT, LOAD_MORE_ROUNDS, LOAD_MORE_WAIT_MS)
 
             html = self.driver.page_source
-            soup = BeautifulSoup(html, 'html.parser')
+            tree = lxml_html.fromstring(html)
+
+            print('   Extracting product links...')
+
+            links = []
+            seen = set()
+
+            # One selector pass over the page, in document order.
+            for el in _PRODUCT_LINK_SEL(tree):
+                clean_url = product_url(el.get('href'))
+
+                if clean_url in seen or '/products/' not in clean_url:
+                    continue
 
-            root_element = soup.select_one('#root')
-            if not root_element:
-                raise Exception('Content not found - possible bot detection')
+                seen.add(clean_url)
+                links.append(clean_url)
 
-            title = self.get_title(soup)
-            prices = self.get_prices(soup)
-            delivery_time = self.get_delivery_time(soup)
-            description = self.get_description(soup)
-            json_ld_data = self.get_json_ld_data(soup)
+                if len(links) >= max_products:
+                    break
+
+            product_links = links[:max_products]
+            print(f'   Found {len(product_links)} product links\n')
+
+            return product_links
+
+        except Exception as e:
+            print(f'   Error getting product links: {e}')
+            return []
+
+    async def fetch_html(self, url: str, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore) -> Optional[Tuple[str, float]]:
+        # Returns the page and the time its request started, taken after the
+        # concurrency slot and host delay so queueing is not counted.
+        async with semaphore:
+            await self.wait_for_host_async(url)
+            start_time = time.time()
+            try:
+                async with session.get(url) as response:
+                    if response.status != 200:
+                        print(f'   HTTP {response.status}: {url}')
+                        return None
+                    return await response.text(), start_time
+            except Exception as e:
+                print(f'   HTTP error for {url}: {e}')
+                return None
+
+    async def fetch_product(self, url: str, session: aiohttp.ClientSession, semaphore: asyncio.Semaphore) -> Optional[Tuple[Dict, float]]:
+        fetched = await self.fetch_html(url, session, semaphore)
+        if fetched is None:
+            return None
+        html, start_time = fetched
 
-            final_title = title or json_ld_data['name']
-            final_description = description or json_ld_data['description']
-            final_regular_price = prices['regularPrice'] or json_ld_data['priceFromJson']
+        # Parsing runs in the process pool so it is not serialized by the GIL;
+        # the event loop keeps downloading while pages are parsed.
+        try:
+            return await asyncio.wrap_future(self.parser_pool.submit(extract_timed, html, start_time))
+        except Exception as e:
+            print(f'   Parse error for {url}: {e}')
+            return None
+
+    async def fetch_all_products(self, urls: List[str]) -> Dict[str, Optional[Tuple[Dict, float]]]:
+        semaphore = asyncio.Semaphore(HTTP_CONCURRENCY)
+        connector = aiohttp.TCPConnector(limit=HTTP_CONCURRENCY, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=30)
+
+        async with aiohttp.ClientSession(connector=connector, headers=HTTP_HEADERS, timeout=timeout) as session:
+            products = await asyncio.gather(*(self.fetch_product(url, session, semaphore) for url in urls))
+
+        return dict(zip(urls, products))
+
+    def fetch_html_browser(self, url: str) -> Tuple[str, float]:
+        # Like fetch_html, also returns when the navigation started; driver
+        # start-up and the host delay are not counted.
+        driver = self.driver
+        self.wait_for_host(url)
+        start_time = time.time()
+        driver.get(url)
+        # get() returns at DOMContentLoaded (eager load strategy); the short
+        # pause leaves time for a script-injected JSON-LD block to attach.
+        self.delay(0.5, 1.0)
+
+        if self.detect_captcha():
+            self.handle_captcha()
+
+        self.scroll_page()
+
+        return driver.page_source, start_time
+
+    def browser_page(self, url: str) -> Future:
+        # Runs on a Chrome worker: the page source goes to the parser pool and
+        # the worker returns right away, so it navigates to its next URL while
+        # this page is still being parsed.
+        print(f'   Falling back to browser: {url}')
+        html, start_time = self.fetch_html_browser(url)
+        return self.parser_pool.submit(extract_timed, html, start_time, False)
+
+    def crawl_products(self, urls: List[str], extracted: Dict[str, Optional[Tuple[Dict, float]]]) -> Iterator[Optional[Dict]]:
+        browser_pages = {
+            url: self.executor.submit(self.browser_page, url)
+            for url in urls if extracted[url] is None
+        }
+        try:
+            for url in urls:
+                yield self.crawl_product(url, extracted[url], browser_pages.get(url))
+        finally:
+            # If the caller stops early, do not keep driving Chrome for pages
+            # nobody will read.
+            for future in browser_pages.values():
+                future.cancel()
+
+    def crawl_product(self, url: str, page: Optional[Tuple[Dict, float]], browser_page: Optional[Future] = None) -> Optional[Dict]:
+        print(f'   Crawling: {url}')
 
+        try:
+            if page is None:
+                page = browser_page.result().result()
+
+            fields, execution_time = page
             product = {
                 'pdp_url': url,
-                'pdp_title_value': final_title,
-                'price_rp': final_regular_price,
-                'price_sp': prices['salePrice'],
-                'delivery_time': delivery_time,
-                'pdp_desc_value': final_description,
-                'web_pid': json_ld_data['productId'],
-                'vosa': json_ld_data['stock'],
-                'pdp_image_url': json_ld_data['imageUrl'],
-                'pdp_image_count': '1' if json_ld_data['imageUrl'] else '0',
+                **fields,
                 'crawledAt': datetime.now().isoformat(),
-                'execution_time': round(time.time() - start_time, 2)
+                'execution_time': execution_time
             }
 
-            print(f'   Success: {final_title[:50]}...')
+            print(f'   Success: {product["pdp_title_value"][:50]}...')
             print(f'   Time: {product["execution_time"]}s')
 
             return product
@@ -313,47 +661,45 @@ class LazadaCrawler:
             print(f'   Error: {e}')
             return None
 
-    def crawl_category(self, category: Dict) -> List[Dict]:
+    def crawl_category(self, category: Dict) -> int:
         print(f'\nCrawling category: {category["name"]}')
         print(f'URL: {category["url"]}')
 
-        category_products = []
+        product_count = 0
+
+        if not self.allowed_urls([category['url']]):
+            return product_count
 
         try:
-            product_links = self.get_product_links(
+            product_links = self.allowed_urls(self.get_product_links(
                 category['url'],
                 category.get('maxProducts', 50)
-            )
+            ))
 
             if not product_links:
                 print(f'No products found for {category["name"]}\n')
-                return category_products
+                return product_count
 
             print(f'   Crawling {len(product_links)} products...')
 
-            for i, link in enumerate(product_links):
-                print(f'   [{i+1}/{len(product_links)}] Processing product...')
+            extracted = asyncio.run(self.fetch_all_products(product_links))
 
-                product = self.crawl_product(link)
+            with closing(self.crawl_products(product_links, extracted)) as products:
+                for link, product in zip(product_links, products):
+                    if product:
+                        product['category'] = category['name']
+                        product_count += 1
+                        self.write_product(product)
+                    else:
+                        self.failed_urls.append(link)
 
-                if product:
-                    product['category'] = category['name']
-                    category_products.append(product)
-                    self.results.append(product)
-                else:
-                    self.failed_urls.append(link)
-
-                if i < len(product_links) - 1:
-                    wait_time = random.randint(3, 5)
-                    print(f'   Waiting {wait_time}s...')
-                    self.delay(wait_time, wait_time + 2)
-
-            print(f'   Completed {category["name"]}: {len(category_products)} products\n')
+            self.flush_products()
+            print(f'   Completed {category["name"]}: {product_count} products\n')
 
         except Exception as e:
             print(f'   Error crawling category: {e}\n')
 
-        return category_products
+        return product_count
 
     def crawl_by_urls(self, urls: List[str]):
         print('Lazada Crawler Started (URL Mode)')
@@ -361,40 +707,25 @@ class LazadaCrawler:
         print(f'Total URLs: {len(urls)}')
         print(f'Estimated time: {len(urls) * 15 / 60:.1f} minutes\n')
 
-        options = uc.ChromeOptions()
-        options.add_argument('--window-size=1920,1080')
-        options.add_argument('--disable-blink-features=AutomationControlled')
-        options.add_argument('--ignore-certificate-errors')
-        options.add_argument('--ignore-ssl-errors=yes')
-
-        self.driver = uc.Chrome(options=options)
-
         try:
-            self.driver.set_window_size(1920, 1080)
+            urls = self.allowed_urls(urls)
 
-            for i, url in enumerate(urls):
-                print(f'\n[{i+1}/{len(urls)}] Processing URL...')
+            print('Fetching product pages...')
+            extracted = asyncio.run(self.fetch_all_products(urls))
 
-                product = self.crawl_product(url)
-
-                if product:
-                    self.results.append(product)
-                else:
-                    self.failed_urls.append(url)
-
-                if i < len(urls) - 1:
-                    wait_time = random.randint(3, 5)
-                    print(f'   Waiting {wait_time}s before next request...')
-                    self.delay(wait_time, wait_time + 2)
+            with closing(self.crawl_products(urls, extracted)) as products:
+                for url, product in zip(urls, products):
+                    if product:
+                        self.write_product(product)
+                    else:
+                        self.failed_urls.append(url)
 
             self.save_results()
 
         except Exception as e:
             print(f'\nFatal error: {e}')
         finally:
-            if self.driver:
-                self.driver.quit()
-                print('\nBrowser closed')
+            self.close()
 
     def crawl_by_categories(self, categories: List[Dict]):
         print('Lazada Crawler Started (Category Mode)')
@@ -403,53 +734,39 @@ class LazadaCrawler:
         print(f'Products per category: {categories[0].get("maxProducts", 50) if categories else 50}')
         print(f'Estimated time: 30-90 minutes\n')
 
-        options = uc.ChromeOptions()
-        options.add_argument('--window-size=1920,1080')
-        options.add_argument('--disable-blink-features=AutomationControlled')
-        options.add_argument('--ignore-certificate-errors')
-        options.add_argument('--ignore-ssl-errors=yes')
-
-        self.driver = uc.Chrome(options=options)
-
         try:
-            self.driver.set_window_size(1920, 1080)
-
             for category in categories:
                 self.crawl_category(category)
 
-                print('Waiting before next category...')
-                self.delay(5, 10)
-
             self.save_results()
 
         except Exception as e:
             print(f'\nFatal error: {e}')
         finally:
-            if self.driver:
-                self.driver.quit()
-                print('\nBrowser closed')
+            self.close()
 
     def save_results(self):
+        self.flush_products()
         Path('data').mkdir(exist_ok=True)
 
-        timestamp = datetime.now().isoformat().replace(':', '-').replace('.', '-')
-        filename = f'data/lazada_products_{timestamp}.json'
+        filename = f'data/lazada_products_{self.timestamp}.json'
 
         output = {
             'crawledAt': datetime.now().isoformat(),
-            'totalProducts': len(self.results),
-            'successfulUrls': len(self.results),
+            'totalProducts': self.product_count,
+            'successfulUrls': self.product_count,
             'failedUrls': len(self.failed_urls),
-            'products': self.results,
+            'productsFile': self.products_file,
             'failed': self.failed_urls
         }
 
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(output, f, ensure_ascii=False, indent=2)
+        with open(filename, 'wb') as f:
+            f.write(orjson.dumps(output, option=orjson.OPT_INDENT_2))
 
-        print(f'\nResults saved to: {filename}')
-        print(f'Total products crawled: {len(self.results)}')
-        print(f'Successful: {len(self.results)}')
+        print(f'\nProducts saved to: {self.products_file}')
+        print(f'Summary saved to: {filename}')
+        print(f'Total products crawled: {self.product_count}')
+        print(f'Successful: {self.product_count}')
         print(f'Failed: {len(self.failed_urls)}')
 
         if self.failed_urls: